@@ -1,18 +1,26 @@
 from __future__ import annotations
 
 import os
+import queue
 import subprocess
 import sys
-from dataclasses import dataclass
+import threading
+from dataclasses import dataclass, replace
+from typing import TextIO
 
 SQL_STAGES = {
     "extensions": "sql/00_extensions.sql",
     "persistent-schema": "sql/05_persistent_tables.sql",
+    "planet-discover": "sql/08_planet_country_queue.sql",
     "build-country": "sql/10_country_boundary.sql",
     "build-country-landmask": "sql/25_country_landmask.sql",
     "build-places": "sql/20_place_points.sql",
     "build-tiles": "sql/30_tiles_z14.sql",
     "assign": "sql/40_tile_city_assignment.sql",
+    "admin-overlay": "sql/42_tile_admin_overlay.sql",
+    "checksums": "sql/45_tile_city_checksums.sql",
+    "checksum-export": "sql/46_tile_city_checksum_export.sql",
+    "diff": "sql/47_tile_city_diff.sql",
     "validate": "sql/50_validation.sql",
     "area-summary": "sql/60_country_tile_area_summary.sql",
     "area-summary-geodesic": "sql/61_country_tile_area_summary_geodesic.sql",
@@ -26,9 +34,24 @@ RUN_ALL_ORDER = [
     "build-places",
     "build-tiles",
     "assign",
+    "admin-overlay",
+    "checksums",
     "area-summary",
 ]
 
+PLANET_COUNTRY_ORDER = [
+    "build-country",
+    "build-country-landmask",
+    "build-places",
+    "build-tiles",
+    "assign",
+    "admin-overlay",
+    "checksums",
+]
+
+STREAM_STAGES = {"checksum-export", "diff"}
+NON_STAGE_COMMANDS = {"validate", "planet-discover", *STREAM_STAGES}
+
 
 @dataclass(frozen=True)
 class Config:
@@ -42,10 +65,13 @@ class Config:
     landmask_bbox_buffer_m: str = os.getenv("LANDMASK_BBOX_BUFFER_M", "10000")
     landmask_source_name: str = os.getenv("LANDMASK_SOURCE_NAME", "osmdata_land_polygons")
     landmask_version: str = os.getenv("LANDMASK_VERSION", "land-polygons-split-3857")
+    country_osm_id: str = os.getenv("COUNTRY_OSM_ID", "")
+    stg_schema: str = os.getenv("STG_SCHEMA", "demo")
+    planet_workers: str = os.getenv("PLANET_WORKERS", "4")
+    planet_log_dir: str = os.getenv("PLANET_LOG_DIR", "data/planet_logs")
 
 
-def run_sql(stage: str, cfg: Config) -> None:
-    sql_file = SQL_STAGES[stage]
+def psql_base_cmd(cfg: Config) -> list[str]:
     cmd = [
         "psql",
         "-U",
@@ -56,6 +82,27 @@ def run_sql(stage: str, cfg: Config) -> None:
         cfg.db_name,
         "-v",
         "ON_ERROR_STOP=1",
+    ]
+    if cfg.db_host.strip():
+        cmd[1:1] = ["-h", cfg.db_host]
+    return cmd
+
+
+def psql_env(cfg: Config) -> dict[str, str]:
+    # Staging tables are unqualified, so each worker gets its own schema first
+    # on the search_path; persistent tables stay schema-qualified in demo.
+    return {**os.environ, "PGOPTIONS": f"-c search_path={cfg.stg_schema},public"}
+
+
+def run_sql(
+    stage: str,
+    cfg: Config,
+    extra_vars: dict[str, str] | None = None,
+    stdin: TextIO | None = None,
+    stdout: TextIO | None = None,
+) -> None:
+    sql_file = SQL_STAGES[stage]
+    cmd = psql_base_cmd(cfg) + [
         "-v",
         f"country_name={cfg.country_name}",
         "-v",
@@ -68,13 +115,210 @@ def run_sql(stage: str, cfg: Config) -> None:
         f"landmask_source_name={cfg.landmask_source_name}",
         "-v",
         f"landmask_version={cfg.landmask_version}",
-        "-f",
-        sql_file,
+        "-v",
+        f"country_osm_id={cfg.country_osm_id}",
+        "-v",
+        f"stg_schema={cfg.stg_schema}",
     ]
-    if cfg.db_host.strip():
-        cmd[1:1] = ["-h", cfg.db_host]
-    print(f"\n==> Running stage: {stage} ({sql_file})")
-    subprocess.run(cmd, check=True)
+    for name, value in (extra_vars or {}).items():
+        cmd += ["-v", f"{name}={value}"]
+    cmd += ["-f", sql_file]
+    if stage in STREAM_STAGES:
+        # Streamed CSV goes to stdout, so keep psql quiet and log to stderr.
+        cmd.insert(1, "-q")
+        print(f"==> Running stage: {stage} ({sql_file})", file=sys.stderr)
+    else:
+        print(f"\n==> Running stage: {stage} ({sql_file})", file=stdout or sys.stdout, flush=True)
+    subprocess.run(
+        cmd,
+        check=True,
+        stdin=stdin,
+        stdout=stdout,
+        stderr=subprocess.STDOUT if stdout else None,
+        env=psql_env(cfg),
+    )
+
+
+def query_psql(sql: str, cfg: Config, variables: dict[str, str] | None = None) -> list[list[str]]:
+    # SQL is sent on stdin (not -c) so psql interpolates :'var' references.
+    cmd = psql_base_cmd(cfg) + ["-X", "-q", "-tA", "-F", "\t"]
+    for name, value in (variables or {}).items():
+        cmd += ["-v", f"{name}={value}"]
+    result = subprocess.run(cmd, check=True, input=sql, capture_output=True, text=True)
+    return [line.split("\t") for line in result.stdout.splitlines() if line]
+
+
+def build_planet_country(job: dict[str, str], cfg: Config, worker: str, stop: threading.Event) -> None:
+    country_cfg = replace(
+        cfg,
+        country_name=job["name"],
+        country_slug=job["slug"],
+        country_osm_id=job["osm_id"],
+        stg_schema=worker,
+    )
+    log_path = os.path.join(cfg.planet_log_dir, f"{job['slug']}.log")
+    print(f"[{worker}] {job['slug']}: ~{job['estimated_tiles']} tiles (log: {log_path})")
+    try:
+        query_psql(
+            """
+            UPDATE demo.planet_build_queue
+            SET status = 'running',
+                attempts = attempts + 1,
+                worker = :'worker',
+                started_at = now(),
+                finished_at = NULL,
+                last_error = NULL
+            WHERE osm_id = :'osm_id'::bigint;
+            """,
+            cfg,
+            {"worker": worker, "osm_id": job["osm_id"]},
+        )
+        with open(log_path, "w", encoding="utf-8") as log:
+            for stage in PLANET_COUNTRY_ORDER:
+                run_sql(stage, country_cfg, stdout=log)
+        query_psql(
+            """
+            UPDATE demo.planet_build_queue
+            SET status = 'done',
+                finished_at = now()
+            WHERE osm_id = :'osm_id'::bigint;
+            """,
+            cfg,
+            {"osm_id": job["osm_id"]},
+        )
+    except Exception as exc:
+        # An interrupted country goes back to the queue untouched; anything
+        # else is recorded so the remaining countries can carry on.
+        interrupted = stop.is_set()
+        try:
+            query_psql(
+                """
+                UPDATE demo.planet_build_queue
+                SET status = :'status',
+                    finished_at = CASE WHEN :'status' = 'failed' THEN now() END,
+                    last_error = NULLIF(:'last_error', '')
+                WHERE osm_id = :'osm_id'::bigint;
+                """,
+                cfg,
+                {
+                    "status": "pending" if interrupted else "failed",
+                    "last_error": "" if interrupted else f"{exc}; see {log_path}",
+                    "osm_id": job["osm_id"],
+                },
+            )
+        except Exception as status_exc:
+            print(f"[{worker}] {job['slug']}: could not record status: {status_exc}")
+        print(f"[{worker}] {job['slug']}: {'interrupted' if interrupted else 'failed'}, see {log_path}")
+        return
+    print(f"[{worker}] {job['slug']}: done")
+
+
+def run_planet_build(args: list[str], cfg: Config) -> None:
+    restart = False
+    rest = list(args)
+    try:
+        workers = int(cfg.planet_workers)
+        while rest:
+            option = rest.pop(0)
+            if option == "--workers" and rest:
+                workers = int(rest.pop(0))
+            elif option == "--restart":
+                restart = True
+            else:
+                raise SystemExit(usage())
+    except ValueError:
+        raise SystemExit(usage())
+    if workers < 1:
+        raise SystemExit(usage())
+
+    worker_schemas = [f"{cfg.stg_schema}_worker_{i + 1}" for i in range(workers)]
+    for schema in worker_schemas:
+        run_sql("extensions", replace(cfg, stg_schema=schema))
+    run_sql("persistent-schema", cfg)
+    run_sql("planet-discover", cfg)
+
+    # Countries that were running when a previous build stopped, or that
+    # failed, are simply picked up again; finished ones are skipped.
+    reset_filter = "" if restart else "WHERE status <> 'done'"
+    query_psql(f"UPDATE demo.planet_build_queue SET status = 'pending' {reset_filter};", cfg)
+    rows = query_psql(
+        """
+        SELECT osm_id, slug, name, estimated_tiles
+        FROM demo.planet_build_queue
+        WHERE status = 'pending'
+        ORDER BY estimated_tiles DESC, osm_id ASC;
+        """,
+        cfg,
+    )
+    # Largest-first list scheduling: idle workers always take the biggest
+    # remaining country, so the small ones fill in the tail of the build.
+    jobs: queue.Queue[dict[str, str]] = queue.Queue()
+    for osm_id, slug, name, estimated_tiles in rows:
+        jobs.put({"osm_id": osm_id, "slug": slug, "name": name, "estimated_tiles": estimated_tiles})
+    print(f"\n==> Planet build: {len(rows)} countries pending, {workers} workers")
+    os.makedirs(cfg.planet_log_dir, exist_ok=True)
+
+    stop = threading.Event()
+
+    def work(worker: str) -> None:
+        while not stop.is_set():
+            try:
+                job = jobs.get_nowait()
+            except queue.Empty:
+                return
+            build_planet_country(job, cfg, worker, stop)
+
+    threads = [threading.Thread(target=work, args=(schema,)) for schema in worker_schemas]
+    for thread in threads:
+        thread.start()
+    try:
+        for thread in threads:
+            thread.join()
+    except KeyboardInterrupt:
+        print("\nInterrupted; waiting for running countries to stop")
+        stop.set()
+        for thread in threads:
+            thread.join()
+        query_psql("UPDATE demo.planet_build_queue SET status = 'pending' WHERE status = 'running';", cfg)
+        raise SystemExit("Planet build interrupted; rerun planet-build to resume")
+
+    unfinished = query_psql(
+        """
+        SELECT slug, status, COALESCE(last_error, '')
+        FROM demo.planet_build_queue
+        WHERE status <> 'done'
+        ORDER BY slug;
+        """,
+        cfg,
+    )
+    if unfinished:
+        for slug, status, last_error in unfinished:
+            print(f"{status}: {slug}: {last_error}")
+        raise SystemExit(f"{len(unfinished)} countries not built; rerun planet-build to retry them")
+    run_sql("area-summary", cfg)
+
+
+def run_diff(args: list[str], cfg: Config) -> None:
+    if not args:
+        # No baseline: stream every block, i.e. a full snapshot for a new replica.
+        run_sql("diff", cfg, extra_vars={"since_build": "", "from_checksum_file": "false"})
+        return
+    if len(args) != 2:
+        raise SystemExit(usage())
+    option, value = args
+    if option == "--since":
+        run_sql("diff", cfg, extra_vars={"since_build": value, "from_checksum_file": "false"})
+        return
+    if option == "--checksums":
+        with open(value, encoding="utf-8") as checksum_file:
+            run_sql(
+                "diff",
+                cfg,
+                extra_vars={"since_build": "", "from_checksum_file": "true"},
+                stdin=checksum_file,
+            )
+        return
+    raise SystemExit(usage())
 
 
 def usage() -> int:
@@ -85,7 +329,10 @@ def usage() -> int:
         "  uv run osm-tile-pipeline validate\n"
         "  uv run osm-tile-pipeline area-summary\n"
         "  uv run osm-tile-pipeline area-summary-geodesic\n"
-        f"Stages: {', '.join(k for k in SQL_STAGES if k != 'validate')}"
+        "  uv run osm-tile-pipeline checksum-export [<build_id>]\n"
+        "  uv run osm-tile-pipeline diff [--since <build_id> | --checksums <file.csv>]\n"
+        "  uv run osm-tile-pipeline planet-build [--workers N] [--restart]\n"
+        f"Stages: {', '.join(k for k in SQL_STAGES if k not in NON_STAGE_COMMANDS)}"
     )
     return 2
 
@@ -106,7 +353,7 @@ def main() -> None:
         if len(args) != 2:
             raise SystemExit(usage())
         stage = args[1]
-        if stage not in SQL_STAGES or stage == "validate":
+        if stage not in SQL_STAGES or stage in NON_STAGE_COMMANDS:
             raise SystemExit(usage())
         run_sql(stage, cfg)
         return
@@ -123,6 +370,21 @@ def main() -> None:
         run_sql("area-summary-geodesic", cfg)
         return
 
+    if command == "checksum-export":
+        if len(args) > 2:
+            raise SystemExit(usage())
+        build_id = args[1] if len(args) == 2 else ""
+        run_sql("checksum-export", cfg, extra_vars={"build_id": build_id})
+        return
+
+    if command == "diff":
+        run_diff(args[1:], cfg)
+        return
+
+    if command == "planet-build":
+        run_planet_build(args[1:], cfg)
+        return
+
     raise SystemExit(usage())
 
 
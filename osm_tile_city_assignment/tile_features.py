@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable
+
+import psycopg
+
+DEFAULT_CACHE_DIR = os.getenv("FEATURE_CACHE_DIR", "data/cache/features")
+COORD_PRECISION = 6
+STREAM_BATCH_ROWS = 5000
+
+BUILD_VERSION_SQL = """
+    WITH target_country AS ({country_sql})
+    SELECT COALESCE(
+        'build-' || (
+            SELECT MAX(b.id)
+            FROM demo.tile_city_z14_builds b
+            WHERE b.country_id = c.id
+        ),
+        'updated-' || to_char(c.updated_at, 'YYYYMMDD"T"HH24MISS')
+    )
+    FROM demo.countries c
+    JOIN target_country t
+      ON t.id = c.id
+"""
+
+FEATURE_STREAM_SQL = """
+    SELECT json_build_object(
+        'type', 'Feature',
+        'properties', f.properties,
+        'geometry', ST_AsGeoJSON(ST_Transform(f.geom, 4326), %(coord_precision)s::int)::json
+    )::text
+    FROM ({feature_sql}) f
+"""
+
+EXTENT_SQL = """
+    SELECT
+        ST_XMin(e.extent),
+        ST_YMin(e.extent),
+        ST_XMax(e.extent),
+        ST_YMax(e.extent)
+    FROM ({extent_sql}) e
+"""
+
+
+@dataclass(frozen=True)
+class FeatureQuery:
+    # country_sql selects the target demo.countries id, feature_sql selects
+    # (properties json, geom geometry) rows and extent_sql selects one
+    # EPSG:4326 `extent` geometry covering those rows.
+    country_key: str
+    variant: str
+    country_sql: str
+    feature_sql: str
+    extent_sql: str
+    params: dict[str, object] = field(default_factory=dict)
+
+    @property
+    def query_hash(self) -> str:
+        payload = json.dumps(
+            [self.country_sql, self.feature_sql, self.extent_sql, self.params, COORD_PRECISION],
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:10]
+
+
+def _slugify(value: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", value.lower()).strip("-") or "country"
+
+
+def _cache_path(cache_dir: str, query: FeatureQuery, build_version: str) -> Path:
+    return (
+        Path(cache_dir)
+        / _slugify(query.country_key)
+        / f"{query.variant}-{build_version}-{query.query_hash}.geojson"
+    )
+
+
+def _latest_cached(cache_dir: str, query: FeatureQuery) -> Path | None:
+    country_dir = Path(cache_dir) / _slugify(query.country_key)
+    candidates = list(country_dir.glob(f"{query.variant}-*-{query.query_hash}.geojson"))
+    if not candidates:
+        return None
+    return max(candidates, key=lambda path: path.stat().st_mtime)
+
+
+def fetch_build_version(conn: psycopg.Connection, query: FeatureQuery) -> str | None:
+    with conn.cursor() as cur:
+        cur.execute(BUILD_VERSION_SQL.format(country_sql=query.country_sql), query.params)
+        row = cur.fetchone()
+    return row[0] if row and row[0] else None
+
+
+def stream_feature_collection(conn: psycopg.Connection, query: FeatureQuery, path: Path) -> int:
+    with conn.cursor() as cur:
+        cur.execute(EXTENT_SQL.format(extent_sql=query.extent_sql), query.params)
+        row = cur.fetchone()
+    bbox = list(row) if row and row[0] is not None else None
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    feature_count = 0
+    params = {**query.params, "coord_precision": COORD_PRECISION}
+    # Feature JSON is built by PostGIS and written through verbatim, so rows are
+    # never parsed in Python; the whole file is parsed once when loaded.
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as out:
+            out.write('{"type":"FeatureCollection","bbox":')
+            out.write(json.dumps(bbox))
+            out.write(',"features":[')
+            with conn.cursor(name="plot_feature_stream") as cur:
+                cur.itersize = STREAM_BATCH_ROWS
+                cur.execute(FEATURE_STREAM_SQL.format(feature_sql=query.feature_sql), params)
+                for (feature_json,) in cur:
+                    if feature_count:
+                        out.write(",")
+                    out.write(feature_json)
+                    feature_count += 1
+            out.write("]}")
+        if feature_count:
+            os.replace(tmp_path, path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+    return feature_count
+
+
+def load_feature_collection(
+    connect: Callable[[], psycopg.Connection],
+    query: FeatureQuery,
+    cache_dir: str = DEFAULT_CACHE_DIR,
+    build_version: str | None = None,
+    refresh: bool = False,
+) -> dict:
+    """Return a GeoJSON FeatureCollection (with `bbox`), hitting the database only on a cache miss.
+
+    Without an explicit build_version the newest cached file for the query is
+    reused as-is. The build version only tracks checksum builds, not stages
+    such as admin-overlay that also feed the features, so refresh=True always
+    re-fetches and overwrites the cached file for the current build.
+    """
+    path: Path | None = None
+    if build_version:
+        path = _cache_path(cache_dir, query, build_version)
+    elif not refresh:
+        path = _latest_cached(cache_dir, query)
+
+    if path is None or not path.exists():
+        with connect() as conn:
+            current_version = fetch_build_version(conn, query)
+            if current_version is None:
+                return {"type": "FeatureCollection", "bbox": None, "features": []}
+            if build_version and build_version != current_version:
+                raise RuntimeError(
+                    f"Build {build_version!r} is not cached and the database is at {current_version!r}."
+                )
+            path = _cache_path(cache_dir, query, current_version)
+            if refresh or not path.exists():
+                print(f"Fetching {query.variant} features for {query.country_key!r} ({current_version})")
+                if not stream_feature_collection(conn, query, path):
+                    return {"type": "FeatureCollection", "bbox": None, "features": []}
+    else:
+        print(f"Using cached features {path}")
+
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def collection_bounds(collection: dict) -> tuple[float, float, float, float] | None:
+    bbox = collection.get("bbox")
+    if not bbox:
+        return None
+    min_lon, min_lat, max_lon, max_lat = bbox
+    return min_lon, min_lat, max_lon, max_lat
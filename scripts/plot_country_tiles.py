@@ -2,12 +2,21 @@
 from __future__ import annotations
 
 import argparse
+import functools
 import json
 import os
 from dataclasses import dataclass
 
 import folium
 import psycopg
+from folium.template import Template
+
+from osm_tile_city_assignment.tile_features import (
+    DEFAULT_CACHE_DIR,
+    FeatureQuery,
+    collection_bounds,
+    load_feature_collection,
+)
 
 
 @dataclass(frozen=True)
@@ -29,59 +38,57 @@ class DbConfig:
         return kwargs
 
 
-def _iter_coords(geometry: dict):
-    geom_type = geometry.get("type")
-    coords = geometry.get("coordinates", [])
-    if geom_type == "Polygon":
-        for ring in coords:
-            for lon, lat in ring:
-                yield lon, lat
-    elif geom_type == "MultiPolygon":
-        for poly in coords:
-            for ring in poly:
-                for lon, lat in ring:
-                    yield lon, lat
-
-
-def compute_bounds(features: list[dict]) -> tuple[float, float, float, float] | None:
-    if not features:
-        return None
-    min_lon = float("inf")
-    min_lat = float("inf")
-    max_lon = float("-inf")
-    max_lat = float("-inf")
-    for feature in features:
-        for lon, lat in _iter_coords(feature["geometry"]):
-            min_lon = min(min_lon, lon)
-            min_lat = min(min_lat, lat)
-            max_lon = max(max_lon, lon)
-            max_lat = max(max_lat, lat)
-    if min_lon == float("inf"):
-        return None
-    return min_lon, min_lat, max_lon, max_lat
-
-
-def fetch_features(conn: psycopg.Connection, country_name: str) -> list[dict]:
-    sql = """
-        WITH target_country AS (
-            SELECT id
-            FROM demo.countries
-            WHERE name ILIKE %(country_name)s
-            LIMIT 1
-        )
+CLASS_COLORS = {
+    "interior_land": "#2a9d8f",
+    "land_dominant": "#8ab17d",
+    "coastal_mixed": "#e9c46a",
+    "water_dominant": "#457b9d",
+}
+TILE_OUTLINE_STYLE = {
+    "color": "#111111",
+    "fill": True,
+    "weight": 0.15,
+    "opacity": 0.7,
+}
+GRID_ZOOM = 14
+
+TARGET_COUNTRY_SQL = """
+    SELECT id
+    FROM demo.countries
+    WHERE name ILIKE %(country_name)s
+    LIMIT 1
+"""
+
+TILES_EXTENT_SQL = f"""
+    WITH target_country AS ({TARGET_COUNTRY_SQL})
+    SELECT ST_Transform(ST_SetSRID(ST_Extent(t.geom)::geometry, 3857), 4326) AS extent
+    FROM demo.tiles_z14 t
+    JOIN target_country c
+      ON c.id = t.country_id
+"""
+
+
+def tiles_query(country_name: str, with_geometry: bool = True) -> FeatureQuery:
+    # Grid mode rebuilds tile squares from (x, y) in the browser, so its cache
+    # entry carries properties only.
+    geom_column = "t.geom" if with_geometry else "NULL::geometry AS geom"
+    sql = f"""
+        WITH target_country AS ({TARGET_COUNTRY_SQL})
         SELECT
-            t.z,
-            t.x,
-            t.y,
-            tc.city_name,
-            tc.place_type,
-            tc.assignment_method,
-            t.tile_class,
-            t.is_boundary_tile,
-            t.land_sample_count,
-            t.land_sample_ratio,
-            t.country_overlap_ratio,
-            ST_AsGeoJSON(ST_Transform(t.geom, 4326)) AS geom_geojson
+            json_build_object(
+                'z', t.z,
+                'x', t.x,
+                'y', t.y,
+                'city_name', tc.city_name,
+                'place_type', tc.place_type,
+                'assignment_method', tc.assignment_method,
+                'tile_class', t.tile_class,
+                'is_boundary_tile', t.is_boundary_tile,
+                'land_sample_count', t.land_sample_count,
+                'land_sample_ratio', ROUND(t.land_sample_ratio::numeric, 4),
+                'country_overlap_ratio', ROUND(t.country_overlap_ratio::numeric, 4)
+            ) AS properties,
+            {geom_column}
         FROM demo.tiles_z14 t
         JOIN demo.tile_city_z14 tc
           ON tc.country_id = t.country_id
@@ -92,91 +99,44 @@ def fetch_features(conn: psycopg.Connection, country_name: str) -> list[dict]:
           ON c.id = t.country_id
         ORDER BY t.x, t.y
     """
-    with conn.cursor() as cur:
-        cur.execute(sql, {"country_name": country_name})
-        rows = cur.fetchall()
-
-    features: list[dict] = []
-    for (
-        z,
-        x,
-        y,
-        city_name,
-        place_type,
-        assignment_method,
-        tile_class,
-        is_boundary_tile,
-        land_sample_count,
-        land_sample_ratio,
-        country_overlap_ratio,
-        geom_geojson,
-    ) in rows:
-        features.append(
-            {
-                "type": "Feature",
-                "properties": {
-                    "z": z,
-                    "x": x,
-                    "y": y,
-                    "city_name": city_name,
-                    "place_type": place_type,
-                    "assignment_method": assignment_method,
-                    "tile_class": tile_class,
-                    "is_boundary_tile": is_boundary_tile,
-                    "land_sample_count": land_sample_count,
-                    "land_sample_ratio": round(land_sample_ratio, 4),
-                    "country_overlap_ratio": round(country_overlap_ratio, 4),
-                },
-                "geometry": json.loads(geom_geojson),
-            }
-        )
-    return features
+    return FeatureQuery(
+        country_key=country_name,
+        variant="tiles" if with_geometry else "tiles-grid",
+        country_sql=TARGET_COUNTRY_SQL,
+        feature_sql=sql,
+        extent_sql=TILES_EXTENT_SQL,
+        params={"country_name": country_name},
+    )
 
 
-def fetch_dissolved_feature(conn: psycopg.Connection, country_name: str) -> list[dict]:
-    sql = """
-        WITH target_country AS (
-            SELECT id
-            FROM demo.countries
-            WHERE name ILIKE %(country_name)s
-            LIMIT 1
-        ),
+def dissolved_query(country_name: str) -> FeatureQuery:
+    sql = f"""
+        WITH target_country AS ({TARGET_COUNTRY_SQL}),
         selected_tiles AS (
             SELECT t.geom
             FROM demo.tiles_z14 t
             JOIN target_country c
               ON c.id = t.country_id
         )
-        SELECT ST_AsGeoJSON(
-            ST_Transform(
-                ST_UnaryUnion(ST_Collect(geom)),
-                4326
-            )
-        ) AS geom_geojson
+        SELECT
+            json_build_object('country_name', %(country_name)s::text) AS properties,
+            ST_UnaryUnion(ST_Collect(geom)) AS geom
         FROM selected_tiles
+        HAVING COUNT(*) > 0
     """
-    with conn.cursor() as cur:
-        cur.execute(sql, {"country_name": country_name})
-        row = cur.fetchone()
-    if not row or not row[0]:
-        return []
-    return [
-        {
-            "type": "Feature",
-            "properties": {"country_name": country_name},
-            "geometry": json.loads(row[0]),
-        }
-    ]
+    return FeatureQuery(
+        country_key=country_name,
+        variant="dissolved",
+        country_sql=TARGET_COUNTRY_SQL,
+        feature_sql=sql,
+        extent_sql=TILES_EXTENT_SQL,
+        params={"country_name": country_name},
+    )
 
 
-def fetch_dissolved_class_features(conn: psycopg.Connection, country_name: str) -> list[dict]:
-    sql = """
-        WITH target_country AS (
-            SELECT id
-            FROM demo.countries
-            WHERE name ILIKE %(country_name)s
-            LIMIT 1
-        ),
+def dissolved_class_query(country_name: str) -> FeatureQuery:
+    sql = f"""
+        WITH target_country AS ({TARGET_COUNTRY_SQL}),
         class_tiles AS (
             SELECT
                 t.tile_class,
@@ -189,35 +149,141 @@ def fetch_dissolved_class_features(conn: psycopg.Connection, country_name: str)
             GROUP BY t.tile_class
         )
         SELECT
-            tile_class,
-            tile_count,
-            avg_land_sample_ratio,
-            ST_AsGeoJSON(ST_Transform(geom, 4326)) AS geom_geojson
+            json_build_object(
+                'tile_class', tile_class,
+                'tile_count', tile_count,
+                'avg_land_sample_ratio', ROUND(avg_land_sample_ratio::numeric, 4)
+            ) AS properties,
+            geom
         FROM class_tiles
         ORDER BY tile_class
     """
-    with conn.cursor() as cur:
-        cur.execute(sql, {"country_name": country_name})
-        rows = cur.fetchall()
-
-    features: list[dict] = []
-    for tile_class, tile_count, avg_land_sample_ratio, geom_geojson in rows:
-        features.append(
-            {
-                "type": "Feature",
-                "properties": {
-                    "tile_class": tile_class,
-                    "tile_count": tile_count,
-                    "avg_land_sample_ratio": round(avg_land_sample_ratio, 4),
-                },
-                "geometry": json.loads(geom_geojson),
+    return FeatureQuery(
+        country_key=country_name,
+        variant="dissolved-by-class",
+        country_sql=TARGET_COUNTRY_SQL,
+        feature_sql=sql,
+        extent_sql=TILES_EXTENT_SQL,
+        params={"country_name": country_name},
+    )
+
+
+def _is_number(value: object) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def encode_tile_grid(collection: dict) -> dict:
+    # Column-oriented payload: x/y indices and all-numeric columns stay inline,
+    # any other column is dictionary-encoded as a whole, z is implied by the
+    # grid zoom.
+    features = collection["features"]
+    names = [name for name in (features[0]["properties"] if features else {}) if name != "z"]
+    columns: dict[str, list] = {
+        name: [feature["properties"].get(name) for feature in features] for name in names
+    }
+    dictionaries: dict[str, list] = {}
+    for name, values in columns.items():
+        if name in ("x", "y") or all(_is_number(value) for value in values):
+            continue
+        lookup: dict = {}
+        for value in values:
+            lookup.setdefault(value, len(lookup))
+        dictionaries[name] = list(lookup)
+        columns[name] = [lookup[value] for value in values]
+    return {
+        "z": GRID_ZOOM,
+        "count": len(features),
+        "columns": columns,
+        "dictionaries": dictionaries,
+    }
+
+
+def _script_json(value: object) -> str:
+    # Compact JSON that is safe inside a <script> block: OSM names may contain
+    # "</script>", so <, > and & are escaped like folium's tojson does.
+    return (
+        json.dumps(value, separators=(",", ":"))
+        .replace("<", "\\u003c")
+        .replace(">", "\\u003e")
+        .replace("&", "\\u0026")
+    )
+
+
+class TileGridLayer(folium.map.Layer):
+    _template = Template(
+        """
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = (function (grid, style, tooltipFields, tooltipAliases) {
+            var n = Math.pow(2, grid.z);
+            function lon(x) { return x / n * 360.0 - 180.0; }
+            function lat(y) { return Math.atan(Math.sinh(Math.PI * (1.0 - 2.0 * y / n))) * 180.0 / Math.PI; }
+            function escapeHtml(value) {
+                return String(value).replace(/[&<>"]/g, function (c) {
+                    return {"&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;"}[c];
+                });
             }
-        )
-    return features
+            var names = Object.keys(grid.columns);
+            var features = new Array(grid.count);
+            for (var i = 0; i < grid.count; i++) {
+                var properties = {z: grid.z};
+                for (var k = 0; k < names.length; k++) {
+                    var name = names[k];
+                    var dictionary = grid.dictionaries[name];
+                    properties[name] = dictionary ? dictionary[grid.columns[name][i]] : grid.columns[name][i];
+                }
+                var west = lon(properties.x), east = lon(properties.x + 1);
+                var north = lat(properties.y), south = lat(properties.y + 1);
+                features[i] = {
+                    type: "Feature",
+                    properties: properties,
+                    geometry: {
+                        type: "Polygon",
+                        coordinates: [[[west, south], [east, south], [east, north], [west, north], [west, south]]]
+                    }
+                };
+            }
+            return L.geoJson({type: "FeatureCollection", features: features}, {
+                style: function (feature) {
+                    var fillColor = style.classColors
+                        ? (style.classColors[feature.properties.tile_class] || style.fillColor)
+                        : style.fillColor;
+                    return Object.assign({fillColor: fillColor}, style.base);
+                },
+                onEachFeature: function (feature, layer) {
+                    if (!tooltipFields) { return; }
+                    // Built on hover so large grids do not pay for every tooltip upfront.
+                    layer.bindTooltip(function (l) {
+                        var rows = tooltipFields.map(function (field, j) {
+                            return "<tr><th>" + escapeHtml(tooltipAliases[j]) + "</th><td>"
+                                + escapeHtml(l.feature.properties[field]) + "</td></tr>";
+                        });
+                        return "<table>" + rows.join("") + "</table>";
+                    }, {sticky: true});
+                }
+            });
+        })({{ this.grid_json }}, {{ this.style_json }}, {{ this.tooltip_fields_json }}, {{ this.tooltip_aliases_json }});
+        {% endmacro %}
+        """
+    )
+
+    def __init__(
+        self,
+        grid: dict,
+        style: dict,
+        tooltip_fields: list[str] | None,
+        tooltip_aliases: list[str] | None,
+        name: str | None = None,
+    ) -> None:
+        super().__init__(name=name, overlay=True)
+        self._name = "TileGridLayer"
+        self.grid_json = _script_json(grid)
+        self.style_json = _script_json(style)
+        self.tooltip_fields_json = _script_json(tooltip_fields)
+        self.tooltip_aliases_json = _script_json(tooltip_aliases)
 
 
 def build_map(
-    features: list[dict],
+    collection: dict,
     bounds: tuple[float, float, float, float] | None,
     fill_color: str,
     fill_opacity: float,
@@ -225,14 +291,8 @@ def build_map(
     tooltip_fields: list[str] | None,
     tooltip_aliases: list[str] | None,
     show_tooltip: bool,
+    grid_encoded: bool = False,
 ) -> folium.Map:
-    class_colors = {
-        "interior_land": "#2a9d8f",
-        "land_dominant": "#8ab17d",
-        "coastal_mixed": "#e9c46a",
-        "water_dominant": "#457b9d",
-    }
-
     if bounds is not None:
         min_lon, min_lat, max_lon, max_lat = bounds
         center = [(min_lat + max_lat) / 2.0, (min_lon + max_lon) / 2.0]
@@ -240,32 +300,41 @@ def build_map(
         center = [46.5, 2.2]
 
     m = folium.Map(location=center, zoom_start=6, tiles="CartoDB positron")
-    geojson = {"type": "FeatureCollection", "features": features}
 
-    tooltip = None
-    if show_tooltip and tooltip_fields and tooltip_aliases:
-        tooltip = folium.GeoJsonTooltip(
-            fields=tooltip_fields,
-            aliases=tooltip_aliases,
+    if grid_encoded:
+        layer = TileGridLayer(
+            grid=encode_tile_grid(collection),
+            style={
+                "classColors": CLASS_COLORS if color_by == "tile-class" else None,
+                "fillColor": fill_color,
+                "base": {**TILE_OUTLINE_STYLE, "fillOpacity": fill_opacity},
+            },
+            tooltip_fields=tooltip_fields if show_tooltip else None,
+            tooltip_aliases=tooltip_aliases if show_tooltip else None,
+            name="Country tiles",
         )
+    else:
+        tooltip = None
+        if show_tooltip and tooltip_fields and tooltip_aliases:
+            tooltip = folium.GeoJsonTooltip(
+                fields=tooltip_fields,
+                aliases=tooltip_aliases,
+            )
 
-    layer = folium.GeoJson(
-        data=geojson,
-        style_function=lambda feature: {
-            "fillColor": (
-                class_colors.get(feature["properties"].get("tile_class"), fill_color)
-                if color_by == "tile-class"
-                else fill_color
-            ),
-            "color": "#111111",
-            "fill": True,
-            "weight": 0.15,
-            "opacity": 0.7,
-            "fillOpacity": fill_opacity,
-        },
-        tooltip=tooltip,
-        name="Country tiles",
-    )
+        layer = folium.GeoJson(
+            data=collection,
+            style_function=lambda feature: {
+                "fillColor": (
+                    CLASS_COLORS.get(feature["properties"].get("tile_class"), fill_color)
+                    if color_by == "tile-class"
+                    else fill_color
+                ),
+                **TILE_OUTLINE_STYLE,
+                "fillOpacity": fill_opacity,
+            },
+            tooltip=tooltip,
+            name="Country tiles",
+        )
     layer.add_to(m)
     folium.LayerControl(collapsed=False).add_to(m)
 
@@ -314,9 +383,27 @@ def parse_args() -> argparse.Namespace:
     )
     parser.add_argument(
         "--mode",
-        choices=["tiles", "dissolved", "dissolved-by-class"],
+        choices=["tiles", "tiles-grid", "dissolved", "dissolved-by-class"],
         default="tiles",
-        help="Output mode: per-tile polygons, one merged polygon, or one dissolved polygon per tile_class.",
+        help=(
+            "Output mode: per-tile polygons, per-tile (x, y) grid indices expanded in the browser, "
+            "one merged polygon, or one dissolved polygon per tile_class."
+        ),
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=DEFAULT_CACHE_DIR,
+        help=f"On-disk feature cache directory (default: FEATURE_CACHE_DIR or {DEFAULT_CACHE_DIR}).",
+    )
+    parser.add_argument(
+        "--build-version",
+        default=None,
+        help="Cached build version to render (e.g. build-42). If omitted, the newest cached build is reused.",
+    )
+    parser.add_argument(
+        "--refresh-cache",
+        action="store_true",
+        help="Re-fetch features from the database, replacing the cached file for the current build.",
     )
     return parser.parse_args()
 
@@ -328,55 +415,63 @@ def main() -> int:
 
     cfg = DbConfig()
     if args.dsn:
-        conn_ctx = psycopg.connect(args.dsn)
+        connect = functools.partial(psycopg.connect, args.dsn)
     else:
-        conn_ctx = psycopg.connect(**cfg.connect_kwargs)
-
-    with conn_ctx as conn:
-        if args.mode == "dissolved":
-            features = fetch_dissolved_feature(conn, country_name=args.country_name)
-            tooltip_fields = ["country_name"]
-            tooltip_aliases = ["Country"]
-        elif args.mode == "dissolved-by-class":
-            features = fetch_dissolved_class_features(conn, country_name=args.country_name)
-            tooltip_fields = ["tile_class", "tile_count", "avg_land_sample_ratio"]
-            tooltip_aliases = ["Tile class", "Tile count", "Avg land ratio"]
-        else:
-            features = fetch_features(conn, country_name=args.country_name)
-            tooltip_fields = [
-                "tile_class",
-                "land_sample_count",
-                "land_sample_ratio",
-                "country_overlap_ratio",
-                "is_boundary_tile",
-                "city_name",
-                "place_type",
-                "assignment_method",
-                "z",
-                "x",
-                "y",
-            ]
-            tooltip_aliases = [
-                "Tile class",
-                "Land samples",
-                "Land sample ratio",
-                "Country overlap ratio",
-                "Boundary tile",
-                "Assigned city",
-                "Place type",
-                "Method",
-                "Z",
-                "X",
-                "Y",
-            ]
-        if not features:
-            raise RuntimeError(
-                f"No tiles found for country_name={args.country_name!r} in demo.countries/demo.tiles_z14."
-            )
-        bounds = compute_bounds(features)
+        connect = functools.partial(psycopg.connect, **cfg.connect_kwargs)
+
+    if args.mode == "dissolved":
+        query = dissolved_query(args.country_name)
+        tooltip_fields = ["country_name"]
+        tooltip_aliases = ["Country"]
+    elif args.mode == "dissolved-by-class":
+        query = dissolved_class_query(args.country_name)
+        tooltip_fields = ["tile_class", "tile_count", "avg_land_sample_ratio"]
+        tooltip_aliases = ["Tile class", "Tile count", "Avg land ratio"]
+    else:
+        query = tiles_query(args.country_name, with_geometry=args.mode != "tiles-grid")
+        tooltip_fields = [
+            "tile_class",
+            "land_sample_count",
+            "land_sample_ratio",
+            "country_overlap_ratio",
+            "is_boundary_tile",
+            "city_name",
+            "place_type",
+            "assignment_method",
+            "z",
+            "x",
+            "y",
+        ]
+        tooltip_aliases = [
+            "Tile class",
+            "Land samples",
+            "Land sample ratio",
+            "Country overlap ratio",
+            "Boundary tile",
+            "Assigned city",
+            "Place type",
+            "Method",
+            "Z",
+            "X",
+            "Y",
+        ]
+
+    collection = load_feature_collection(
+        connect,
+        query,
+        cache_dir=args.cache_dir,
+        build_version=args.build_version,
+        refresh=args.refresh_cache,
+    )
+    features = collection["features"]
+    if not features:
+        raise RuntimeError(
+            f"No tiles found for country_name={args.country_name!r} in demo.countries/demo.tiles_z14."
+        )
+    bounds = collection_bounds(collection)
 
     m = build_map(
-        features=features,
+        collection=collection,
         bounds=bounds,
         fill_color=args.fill_color,
         fill_opacity=args.fill_opacity,
@@ -384,6 +479,7 @@ def main() -> int:
         tooltip_fields=tooltip_fields,
         tooltip_aliases=tooltip_aliases,
         show_tooltip=True,
+        grid_encoded=args.mode == "tiles-grid",
     )
     os.makedirs(os.path.dirname(args.output), exist_ok=True)
     m.save(args.output)
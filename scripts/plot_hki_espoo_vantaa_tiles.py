@@ -2,13 +2,20 @@
 from __future__ import annotations
 
 import argparse
-import json
+import functools
 import os
 from dataclasses import dataclass
 
 import folium
 import psycopg
 
+from osm_tile_city_assignment.tile_features import (
+    DEFAULT_CACHE_DIR,
+    FeatureQuery,
+    collection_bounds,
+    load_feature_collection,
+)
+
 
 CITY_COLORS = {
     "Helsinki": "#e41a1c",
@@ -38,106 +45,86 @@ class DbConfig:
         return kwargs
 
 
-def _iter_coords(geometry: dict):
-    geom_type = geometry.get("type")
-    coords = geometry.get("coordinates", [])
-    if geom_type == "Polygon":
-        for ring in coords:
-            for lon, lat in ring:
-                yield lon, lat
-    elif geom_type == "MultiPolygon":
-        for poly in coords:
-            for ring in poly:
-                for lon, lat in ring:
-                    yield lon, lat
+TARGET_COUNTRY_SQL = """
+    SELECT id
+    FROM demo.countries
+    WHERE slug = %(country_slug)s
+    LIMIT 1
+"""
 
+CITY_BOUNDARIES_CTE = f"""
+    target_cities AS (
+        SELECT * FROM (VALUES ('Helsinki'), ('Espoo'), ('Vantaa')) AS t(city_name)
+    ),
+    target_country AS ({TARGET_COUNTRY_SQL}),
+    matched_boundaries AS (
+        SELECT
+            tc.city_name,
+            ab.osm_id,
+            ab.admin_level,
+            ab.geom,
+            ROW_NUMBER() OVER (
+                PARTITION BY tc.city_name
+                ORDER BY ST_Area(ab.geom) DESC, ab.osm_id ASC
+            ) AS rn
+        FROM demo.admin_boundaries ab
+        JOIN target_country c
+          ON c.id = ab.country_id
+        JOIN target_cities tc
+          ON (
+              ab.name = tc.city_name
+              OR ab.name_fi = tc.city_name
+              OR ab.name_sv = tc.city_name
+              OR ab.name_en = tc.city_name
+          )
+    ),
+    city_boundaries AS (
+        SELECT city_name, osm_id, admin_level, geom
+        FROM matched_boundaries
+        WHERE rn = 1
+    )
+"""
 
-def compute_bounds(features: list[dict]) -> tuple[float, float, float, float] | None:
-    if not features:
-        return None
-    min_lon = float("inf")
-    min_lat = float("inf")
-    max_lon = float("-inf")
-    max_lat = float("-inf")
-    for feature in features:
-        for lon, lat in _iter_coords(feature["geometry"]):
-            min_lon = min(min_lon, lon)
-            min_lat = min(min_lat, lat)
-            max_lon = max(max_lon, lon)
-            max_lat = max(max_lat, lat)
-    if min_lon == float("inf"):
-        return None
-    return min_lon, min_lat, max_lon, max_lat
-
-
-def fetch_features(conn: psycopg.Connection, country_slug: str) -> list[dict]:
-    sql = """
-        WITH target_cities AS (
-            SELECT * FROM (VALUES ('Helsinki'), ('Espoo'), ('Vantaa')) AS t(city_name)
-        ),
-        target_country AS (
-            SELECT id
-            FROM demo.countries
-            WHERE slug = %(country_slug)s
-            LIMIT 1
-        ),
-        matched_boundaries AS (
-            SELECT
-                tc.city_name,
-                ab.geom,
-                ROW_NUMBER() OVER (
-                    PARTITION BY tc.city_name
-                    ORDER BY ST_Area(ab.geom) DESC, ab.osm_id ASC
-                ) AS rn
-            FROM demo.admin_boundaries ab
-            JOIN target_country c
-              ON c.id = ab.country_id
-            JOIN target_cities tc
-              ON (
-                  ab.name = tc.city_name
-                  OR ab.name_fi = tc.city_name
-                  OR ab.name_sv = tc.city_name
-                  OR ab.name_en = tc.city_name
-              )
-        ),
-        city_boundaries AS (
-            SELECT city_name, geom
-            FROM matched_boundaries
-            WHERE rn = 1
-        )
+
+def city_tiles_query(country_slug: str) -> FeatureQuery:
+    sql = f"""
+        WITH {CITY_BOUNDARIES_CTE}
         SELECT
-            t.z,
-            t.x,
-            t.y,
-            b.city_name,
-            ST_AsGeoJSON(ST_Transform(t.geom, 4326)) AS geom_geojson
-        FROM demo.tiles_z14 t
+            json_build_object(
+                'z', t.z,
+                'x', t.x,
+                'y', t.y,
+                'city', b.city_name
+            ) AS properties,
+            t.geom
+        FROM city_boundaries b
         JOIN target_country c
-          ON c.id = t.country_id
-        JOIN city_boundaries b
-          ON ST_Covers(b.geom, t.centroid)
+          ON TRUE
+        JOIN demo.tile_admin_z14 ta
+          ON ta.country_id = c.id
+         AND ta.admin_osm_id = b.osm_id
+         AND ta.admin_level = b.admin_level
+         AND ta.covers_centroid
+        JOIN demo.tiles_z14 t
+          ON t.country_id = ta.country_id
+         AND t.z = ta.z
+         AND t.x = ta.x
+         AND t.y = ta.y
         ORDER BY b.city_name, t.x, t.y
     """
-    with conn.cursor() as cur:
-        cur.execute(sql, {"country_slug": country_slug})
-        rows = cur.fetchall()
-
-    features: list[dict] = []
-    for z, x, y, city, geom_geojson in rows:
-        features.append(
-            {
-                "type": "Feature",
-                "properties": {
-                    "z": z,
-                    "x": x,
-                    "y": y,
-                    "city": city,
-                    "color": CITY_COLORS[city],
-                },
-                "geometry": json.loads(geom_geojson),
-            }
-        )
-    return features
+    extent_sql = f"""
+        WITH {CITY_BOUNDARIES_CTE}
+        SELECT ST_Transform(ST_SetSRID(ST_Extent(geom)::geometry, 3857), 4326) AS extent
+        FROM city_boundaries
+    """
+    return FeatureQuery(
+        country_key=country_slug,
+        variant="hki-espoo-vantaa",
+        country_sql=TARGET_COUNTRY_SQL,
+        feature_sql=sql,
+        extent_sql=extent_sql,
+        params={"country_slug": country_slug},
+    )
 
 
 def fetch_loaded_country_name(conn: psycopg.Connection) -> str | None:
@@ -148,7 +135,7 @@ def fetch_loaded_country_name(conn: psycopg.Connection) -> str | None:
     return row[0] if row and row[0] else None
 
 
-def build_map(features: list[dict], bounds: tuple[float, float, float, float] | None) -> folium.Map:
+def build_map(collection: dict, bounds: tuple[float, float, float, float] | None) -> folium.Map:
     if bounds is not None:
         min_lon, min_lat, max_lon, max_lat = bounds
         center = [(min_lat + max_lat) / 2.0, (min_lon + max_lon) / 2.0]
@@ -156,12 +143,11 @@ def build_map(features: list[dict], bounds: tuple[float, float, float, float] |
         center = [60.22, 24.9]
 
     m = folium.Map(location=center, zoom_start=10, tiles="CartoDB positron")
-    geojson = {"type": "FeatureCollection", "features": features}
 
     layer = folium.GeoJson(
-        data=geojson,
+        data=collection,
         style_function=lambda feature: {
-            "fillColor": feature["properties"]["color"],
+            "fillColor": CITY_COLORS[feature["properties"]["city"]],
             "color": "#111111",
             "fill": True,
             "weight": 0.35,
@@ -200,6 +186,21 @@ def parse_args() -> argparse.Namespace:
         default=None,
         help="Country slug from demo.countries to read tiles from (default: COUNTRY_SLUG or finland).",
     )
+    parser.add_argument(
+        "--cache-dir",
+        default=DEFAULT_CACHE_DIR,
+        help=f"On-disk feature cache directory (default: FEATURE_CACHE_DIR or {DEFAULT_CACHE_DIR}).",
+    )
+    parser.add_argument(
+        "--build-version",
+        default=None,
+        help="Cached build version to render (e.g. build-42). If omitted, the newest cached build is reused.",
+    )
+    parser.add_argument(
+        "--refresh-cache",
+        action="store_true",
+        help="Re-fetch features from the database, replacing the cached file for the current build.",
+    )
     return parser.parse_args()
 
 
@@ -208,23 +209,30 @@ def main() -> int:
     cfg = DbConfig()
 
     if args.dsn:
-        conn_ctx = psycopg.connect(args.dsn)
+        connect = functools.partial(psycopg.connect, args.dsn)
     else:
-        conn_ctx = psycopg.connect(**cfg.connect_kwargs)
+        connect = functools.partial(psycopg.connect, **cfg.connect_kwargs)
 
     country_slug = args.country_slug or cfg.country_slug
-    with conn_ctx as conn:
-        features = fetch_features(conn, country_slug=country_slug)
-        if not features:
+    collection = load_feature_collection(
+        connect,
+        city_tiles_query(country_slug),
+        cache_dir=args.cache_dir,
+        build_version=args.build_version,
+        refresh=args.refresh_cache,
+    )
+    features = collection["features"]
+    if not features:
+        with connect() as conn:
             country_name = fetch_loaded_country_name(conn)
-            country_suffix = f" Most recently updated country is '{country_name}'." if country_name else ""
-            raise RuntimeError(
-                f"No municipality tiles found for {', '.join(TARGET_CITIES)} in country_slug={country_slug!r}.{country_suffix}"
-                " Make sure the selected country has those city assignments."
-            )
-        bounds = compute_bounds(features)
-
-    m = build_map(features, bounds)
+        country_suffix = f" Most recently updated country is '{country_name}'." if country_name else ""
+        raise RuntimeError(
+            f"No municipality tiles found for {', '.join(TARGET_CITIES)} in country_slug={country_slug!r}.{country_suffix}"
+            " Make sure the selected country has those city assignments and admin-overlay has been run."
+        )
+    bounds = collection_bounds(collection)
+
+    m = build_map(collection, bounds)
     os.makedirs(os.path.dirname(args.output), exist_ok=True)
     m.save(args.output)
     print(f"Wrote {len(features)} tiles to {args.output}")
@@ -25,6 +25,26 @@ BEGIN
     END IF;
 END $$;
 
+CREATE OR REPLACE FUNCTION demo.lon_to_tile_x(lon double precision, z int)
+RETURNS int
+LANGUAGE sql
+IMMUTABLE
+AS $$
+    SELECT FLOOR((lon + 180.0) / 360.0 * (2 ^ z))::int;
+$$;
+
+CREATE OR REPLACE FUNCTION demo.lat_to_tile_y(lat double precision, z int)
+RETURNS int
+LANGUAGE sql
+IMMUTABLE
+AS $$
+    SELECT FLOOR(
+        (
+            1.0 - LN(TAN(RADIANS(lat)) + (1.0 / COS(RADIANS(lat)))) / PI()
+        ) / 2.0 * (2 ^ z)
+    )::int;
+$$;
+
 CREATE TABLE IF NOT EXISTS demo.countries (
     id bigserial PRIMARY KEY,
     slug text NOT NULL UNIQUE,
@@ -105,6 +125,99 @@ CREATE TABLE IF NOT EXISTS demo.tile_city_z14 (
 
 CREATE INDEX IF NOT EXISTS tile_city_z14_country_idx ON demo.tile_city_z14 (country_id);
 
+CREATE TABLE IF NOT EXISTS demo.tile_city_z14_builds (
+    id bigserial PRIMARY KEY,
+    country_id bigint NOT NULL REFERENCES demo.countries(id) ON DELETE CASCADE,
+    tile_count bigint NOT NULL,
+    root_checksum text NOT NULL,
+    built_at timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS tile_city_z14_builds_country_idx ON demo.tile_city_z14_builds (country_id, id);
+
+CREATE TABLE IF NOT EXISTS demo.tile_city_z14_checksums (
+    build_id bigint NOT NULL REFERENCES demo.tile_city_z14_builds(id) ON DELETE CASCADE,
+    block_z int NOT NULL,
+    block_x int NOT NULL,
+    block_y int NOT NULL,
+    tile_count int NOT NULL,
+    checksum text NOT NULL,
+    PRIMARY KEY (build_id, block_z, block_x, block_y)
+);
+
+-- Checksum tree of one country's live tile assignments: z10 blocks over tile
+-- rows, z6 blocks over z10 checksums and a z0 country root over z6 checksums.
+CREATE OR REPLACE FUNCTION demo.tile_city_checksum_tree(target_country_id bigint)
+RETURNS TABLE (block_z int, block_x int, block_y int, tile_count int, checksum text)
+LANGUAGE sql
+STABLE
+AS $$
+    WITH tile_hashes AS (
+        SELECT
+            tc.x / 16 AS block_x,
+            tc.y / 16 AS block_y,
+            tc.x,
+            tc.y,
+            md5(
+                concat_ws(
+                    '|',
+                    tc.z,
+                    tc.x,
+                    tc.y,
+                    tc.city_osm_id,
+                    tc.city_name,
+                    tc.place_type,
+                    tc.distance_m,
+                    tc.assignment_method
+                )
+            ) AS tile_hash
+        FROM demo.tile_city_z14 tc
+        WHERE tc.country_id = target_country_id
+    ), z10_blocks AS (
+        SELECT
+            10 AS block_z,
+            block_x,
+            block_y,
+            COUNT(*)::int AS tile_count,
+            md5(string_agg(tile_hash, '' ORDER BY x, y)) AS checksum
+        FROM tile_hashes
+        GROUP BY block_x, block_y
+    ), z6_blocks AS (
+        SELECT
+            6 AS block_z,
+            block_x / 16 AS block_x,
+            block_y / 16 AS block_y,
+            SUM(tile_count)::int AS tile_count,
+            md5(
+                string_agg(
+                    concat_ws(':', block_x, block_y, checksum),
+                    ',' ORDER BY block_x, block_y
+                )
+            ) AS checksum
+        FROM z10_blocks
+        GROUP BY block_x / 16, block_y / 16
+    ), country_root AS (
+        SELECT
+            0 AS block_z,
+            0 AS block_x,
+            0 AS block_y,
+            SUM(tile_count)::int AS tile_count,
+            md5(
+                string_agg(
+                    concat_ws(':', block_x, block_y, checksum),
+                    ',' ORDER BY block_x, block_y
+                )
+            ) AS checksum
+        FROM z6_blocks
+        HAVING COUNT(*) > 0
+    )
+    SELECT block_z, block_x, block_y, tile_count, checksum FROM z10_blocks
+    UNION ALL
+    SELECT block_z, block_x, block_y, tile_count, checksum FROM z6_blocks
+    UNION ALL
+    SELECT block_z, block_x, block_y, tile_count, checksum FROM country_root;
+$$;
+
 CREATE TABLE IF NOT EXISTS demo.admin_boundaries (
     country_id bigint NOT NULL REFERENCES demo.countries(id) ON DELETE CASCADE,
     osm_id bigint NOT NULL,
@@ -120,3 +233,40 @@ CREATE TABLE IF NOT EXISTS demo.admin_boundaries (
 CREATE INDEX IF NOT EXISTS admin_boundaries_country_idx ON demo.admin_boundaries (country_id);
 CREATE INDEX IF NOT EXISTS admin_boundaries_name_idx ON demo.admin_boundaries (name);
 CREATE INDEX IF NOT EXISTS admin_boundaries_geom_gix ON demo.admin_boundaries USING GIST (geom);
+
+CREATE TABLE IF NOT EXISTS demo.tile_admin_z14 (
+    country_id bigint NOT NULL REFERENCES demo.countries(id) ON DELETE CASCADE,
+    z int NOT NULL,
+    x int NOT NULL,
+    y int NOT NULL,
+    admin_level text NOT NULL,
+    admin_osm_id bigint NOT NULL,
+    overlap_ratio double precision NOT NULL,
+    covers_centroid boolean NOT NULL,
+    is_edge_tile boolean NOT NULL,
+    PRIMARY KEY (country_id, z, x, y, admin_level),
+    FOREIGN KEY (country_id, z, x, y)
+        REFERENCES demo.tiles_z14 (country_id, z, x, y)
+        ON DELETE CASCADE,
+    FOREIGN KEY (country_id, admin_osm_id)
+        REFERENCES demo.admin_boundaries (country_id, osm_id)
+        ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS tile_admin_z14_admin_idx ON demo.tile_admin_z14 (country_id, admin_osm_id);
+
+CREATE TABLE IF NOT EXISTS demo.planet_build_queue (
+    osm_id bigint PRIMARY KEY,
+    slug text NOT NULL UNIQUE,
+    name text NOT NULL,
+    estimated_tiles bigint NOT NULL,
+    status text NOT NULL DEFAULT 'pending',
+    attempts int NOT NULL DEFAULT 0,
+    worker text,
+    started_at timestamptz,
+    finished_at timestamptz,
+    last_error text
+);
+
+CREATE INDEX IF NOT EXISTS planet_build_queue_status_idx
+    ON demo.planet_build_queue (status, estimated_tiles DESC);
@@ -0,0 +1,98 @@
+\set ON_ERROR_STOP on
+
+DROP TABLE IF EXISTS planet_boundaries;
+
+-- osm2pgsql splits multipolygon countries into one row per part and
+-- build-country keeps only the largest one, so estimate from that same part.
+CREATE TEMP TABLE planet_boundaries AS
+SELECT
+    osm_id,
+    name,
+    slug_source,
+    ST_Envelope(way) AS extent
+FROM (
+    SELECT DISTINCT ON (osm_id)
+        osm_id,
+        COALESCE(name, tags->'name', tags->'name:en') AS name,
+        COALESCE(NULLIF(tags->'name:en', ''), name, tags->'name') AS slug_source,
+        way
+    FROM planet_osm_polygon
+    WHERE boundary = 'administrative'
+      AND admin_level = '2'
+    ORDER BY osm_id, ST_Area(ST_CollectionExtract(ST_MakeValid(way), 3)) DESC
+) largest_part
+WHERE name IS NOT NULL;
+
+-- Countries that disappeared from (or lost their name in) a newer planet
+-- import are dropped, so the build never waits on a country it cannot find.
+DELETE FROM demo.planet_build_queue q
+WHERE NOT EXISTS (
+    SELECT 1
+    FROM planet_boundaries b
+    WHERE b.osm_id = q.osm_id
+);
+
+WITH constants AS (
+    SELECT
+        20037508.342789244::double precision AS origin_m,
+        (40075016.68557849 / 16384.0)::double precision AS tile_edge_m
+), estimates AS (
+    -- Envelope x/y ranges of the part build-country keeps, i.e. the range
+    -- build-tiles expands into candidate tiles.
+    SELECT
+        b.osm_id,
+        b.name,
+        COALESCE(
+            NULLIF(
+                trim(BOTH '-' FROM lower(regexp_replace(b.slug_source, '[^a-zA-Z0-9]+', '-', 'g'))),
+                ''
+            ),
+            'osm-' || abs(b.osm_id)
+        ) AS base_slug,
+        (
+            (FLOOR((ST_XMax(b.extent) + k.origin_m) / k.tile_edge_m)
+             - FLOOR((ST_XMin(b.extent) + k.origin_m) / k.tile_edge_m) + 1)
+            * (FLOOR((ST_YMax(b.extent) + k.origin_m) / k.tile_edge_m)
+               - FLOOR((ST_YMin(b.extent) + k.origin_m) / k.tile_edge_m) + 1)
+        )::bigint AS estimated_tiles
+    FROM planet_boundaries b
+    CROSS JOIN constants k
+), ranked AS (
+    SELECT
+        e.*,
+        ROW_NUMBER() OVER (
+            PARTITION BY e.base_slug
+            ORDER BY e.estimated_tiles DESC, e.osm_id ASC
+        ) AS rn
+    FROM estimates e
+)
+INSERT INTO demo.planet_build_queue (osm_id, slug, name, estimated_tiles)
+SELECT
+    r.osm_id,
+    CASE
+        WHEN r.rn > 1
+          OR EXISTS (
+              SELECT 1
+              FROM demo.planet_build_queue q
+              WHERE q.slug = r.base_slug
+                AND q.osm_id <> r.osm_id
+          )
+        THEN r.base_slug || '-' || abs(r.osm_id)
+        ELSE r.base_slug
+    END,
+    r.name,
+    r.estimated_tiles
+FROM ranked r
+ON CONFLICT (osm_id) DO UPDATE
+SET
+    name = EXCLUDED.name,
+    estimated_tiles = EXCLUDED.estimated_tiles;
+
+\echo '=== Planet build queue ==='
+SELECT
+    status,
+    COUNT(*) AS countries,
+    SUM(estimated_tiles) AS estimated_tiles
+FROM demo.planet_build_queue
+GROUP BY status
+ORDER BY status;
@@ -1,8 +1,8 @@
 \set ON_ERROR_STOP on
 
-DROP TABLE IF EXISTS demo.stg_country_boundary;
+DROP TABLE IF EXISTS stg_country_boundary;
 
-CREATE TABLE demo.stg_country_boundary AS
+CREATE TABLE stg_country_boundary AS
 WITH candidates AS (
     SELECT
         osm_id,
@@ -12,9 +12,15 @@ WITH candidates AS (
     WHERE boundary = 'administrative'
       AND admin_level = '2'
       AND (
-          COALESCE(name, '') ILIKE :'country_name'
-          OR COALESCE(tags->'name', '') ILIKE :'country_name'
-          OR COALESCE(tags->'name:en', '') ILIKE :'country_name'
+          CASE
+              WHEN NULLIF(:'country_osm_id', '') IS NOT NULL THEN
+                  osm_id = NULLIF(:'country_osm_id', '')::bigint
+              ELSE (
+                  COALESCE(name, '') ILIKE :'country_name'
+                  OR COALESCE(tags->'name', '') ILIKE :'country_name'
+                  OR COALESCE(tags->'name:en', '') ILIKE :'country_name'
+              )
+          END
       )
 ), ranked AS (
     SELECT
@@ -31,16 +37,16 @@ SELECT
 FROM ranked
 WHERE rn = 1;
 
-ALTER TABLE demo.stg_country_boundary
+ALTER TABLE stg_country_boundary
     ALTER COLUMN geom SET NOT NULL;
 
-CREATE INDEX stg_country_boundary_geom_gix ON demo.stg_country_boundary USING GIST (geom);
+CREATE INDEX stg_country_boundary_geom_gix ON stg_country_boundary USING GIST (geom);
 
 DO $$
 DECLARE
     boundary_count int;
 BEGIN
-    SELECT COUNT(*) INTO boundary_count FROM demo.stg_country_boundary;
+    SELECT COUNT(*) INTO boundary_count FROM stg_country_boundary;
     IF boundary_count <> 1 THEN
         RAISE EXCEPTION 'Expected exactly one country boundary match; found %', boundary_count;
     END IF;
@@ -53,7 +59,7 @@ SELECT
     name,
     geom,
     now()
-FROM demo.stg_country_boundary
+FROM stg_country_boundary
 ON CONFLICT (slug) DO UPDATE
 SET
     osm_id = EXCLUDED.osm_id,
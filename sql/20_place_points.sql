@@ -1,8 +1,8 @@
 \set ON_ERROR_STOP on
 
-DROP TABLE IF EXISTS demo.stg_place_points;
+DROP TABLE IF EXISTS stg_place_points;
 
-CREATE TABLE demo.stg_place_points AS
+CREATE TABLE stg_place_points AS
 SELECT
     p.osm_id::bigint AS osm_id,
     p.name::text AS name,
@@ -21,18 +21,18 @@ SELECT
     END::int AS place_rank,
     p.way::geometry(Point, 3857) AS geom
 FROM planet_osm_point p
-JOIN demo.stg_country_boundary c
+JOIN stg_country_boundary c
   ON ST_DWithin(p.way, c.geom, :'fallback_radius_m'::double precision)
 WHERE p.name IS NOT NULL
   AND p.place IN ('city', 'town', 'village', 'suburb', 'neighbourhood');
 
-ALTER TABLE demo.stg_place_points
+ALTER TABLE stg_place_points
     ALTER COLUMN geom SET NOT NULL,
     ALTER COLUMN place_rank SET NOT NULL;
 
-CREATE INDEX stg_place_points_geom_gix ON demo.stg_place_points USING GIST (geom);
-CREATE INDEX stg_place_points_rank_idx ON demo.stg_place_points (place_rank);
-CREATE INDEX stg_place_points_rank_pop_osm_idx ON demo.stg_place_points (place_rank, population DESC NULLS LAST, osm_id);
+CREATE INDEX stg_place_points_geom_gix ON stg_place_points USING GIST (geom);
+CREATE INDEX stg_place_points_rank_idx ON stg_place_points (place_rank);
+CREATE INDEX stg_place_points_rank_pop_osm_idx ON stg_place_points (place_rank, population DESC NULLS LAST, osm_id);
 
 DELETE FROM demo.admin_boundaries ab
 USING demo.countries c
@@ -60,7 +60,7 @@ WITH candidates AS (
         p.admin_level::text AS admin_level,
         ST_Multi(ST_CollectionExtract(ST_MakeValid(p.way), 3))::geometry(MultiPolygon, 3857) AS geom
     FROM planet_osm_polygon p
-    JOIN demo.stg_country_boundary cb
+    JOIN stg_country_boundary cb
       ON ST_Intersects(p.way, cb.geom)
     JOIN demo.countries c
       ON c.slug = :'country_slug'
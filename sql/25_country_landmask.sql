@@ -13,16 +13,16 @@ WHERE source_name = :'landmask_source_name'
 \quit 1
 \endif
 
-DROP TABLE IF EXISTS demo.stg_country_landmask;
+DROP TABLE IF EXISTS stg_country_landmask;
 
-CREATE TABLE demo.stg_country_landmask AS
+CREATE TABLE stg_country_landmask AS
 WITH country AS (
     SELECT
         ST_Expand(
             ST_Envelope(geom),
             (:'landmask_bbox_buffer_m')::double precision
         ) AS buffered_bbox
-    FROM demo.stg_country_boundary
+    FROM stg_country_boundary
 )
 SELECT
     glp.id,
@@ -36,7 +36,7 @@ WHERE glp.source_name = :'landmask_source_name'
   AND glp.geom && c.buffered_bbox;
 
 CREATE INDEX stg_country_landmask_geom_gix
-    ON demo.stg_country_landmask
+    ON stg_country_landmask
     USING GIST (geom);
 
-ANALYZE demo.stg_country_landmask;
+ANALYZE stg_country_landmask;
@@ -1,46 +1,26 @@
 \set ON_ERROR_STOP on
 
-CREATE OR REPLACE FUNCTION demo.lon_to_tile_x(lon double precision, z int)
-RETURNS int
-LANGUAGE sql
-IMMUTABLE
-AS $$
-    SELECT FLOOR((lon + 180.0) / 360.0 * (2 ^ z))::int;
-$$;
-
-CREATE OR REPLACE FUNCTION demo.lat_to_tile_y(lat double precision, z int)
-RETURNS int
-LANGUAGE sql
-IMMUTABLE
-AS $$
-    SELECT FLOOR(
-        (
-            1.0 - LN(TAN(RADIANS(lat)) + (1.0 / COS(RADIANS(lat)))) / PI()
-        ) / 2.0 * (2 ^ z)
-    )::int;
-$$;
-
 DO $$
 BEGIN
-    IF to_regclass('demo.stg_country_landmask') IS NULL THEN
+    IF to_regclass('stg_country_landmask') IS NULL THEN
         RAISE EXCEPTION
-            'demo.stg_country_landmask is missing; run build-country-landmask before build-tiles';
+            'stg_country_landmask is missing; run build-country-landmask before build-tiles';
     END IF;
 END $$;
 
-DROP TABLE IF EXISTS demo.stg_tiles_z14;
+DROP TABLE IF EXISTS stg_tiles_z14;
 
-CREATE TABLE demo.stg_tiles_z14 AS
+CREATE TABLE stg_tiles_z14 AS
 WITH thresholds AS (
     SELECT 5::int AS total_sample_points
 ), country AS (
     SELECT
         geom,
         ST_Boundary(geom) AS boundary_geom
-    FROM demo.stg_country_boundary
+    FROM stg_country_boundary
 ), bbox AS (
     SELECT ST_Transform(ST_Envelope(geom), 4326) AS geom
-    FROM demo.stg_country_boundary
+    FROM stg_country_boundary
 ), raw_ranges AS (
     SELECT
         demo.lon_to_tile_x(ST_XMin(geom), 14) AS x_a,
@@ -161,7 +141,7 @@ WITH thresholds AS (
         sp.y,
         sp.sample_id
     FROM sample_points sp
-    JOIN demo.stg_country_landmask lm
+    JOIN stg_country_landmask lm
       ON lm.geom && sp.sample_point
      AND ST_Intersects(sp.sample_point, lm.geom)
 ), land_samples AS (
@@ -196,11 +176,11 @@ LEFT JOIN land_samples ls
  AND ls.y = t.y
 CROSS JOIN thresholds;
 
-ALTER TABLE demo.stg_tiles_z14
+ALTER TABLE stg_tiles_z14
     ADD CONSTRAINT stg_tiles_z14_pk PRIMARY KEY (z, x, y);
 
-CREATE INDEX stg_tiles_z14_geom_gix ON demo.stg_tiles_z14 USING GIST (geom);
-CREATE INDEX stg_tiles_z14_centroid_gix ON demo.stg_tiles_z14 USING GIST (centroid);
+CREATE INDEX stg_tiles_z14_geom_gix ON stg_tiles_z14 USING GIST (geom);
+CREATE INDEX stg_tiles_z14_centroid_gix ON stg_tiles_z14 USING GIST (centroid);
 
 DELETE FROM demo.tiles_z14 t
 USING demo.countries c
@@ -232,6 +212,6 @@ SELECT
     t.land_sample_count,
     t.land_sample_ratio,
     t.tile_class
-FROM demo.stg_tiles_z14 t
+FROM stg_tiles_z14 t
 JOIN demo.countries c
   ON c.slug = :'country_slug';
@@ -0,0 +1,201 @@
+\set ON_ERROR_STOP on
+
+DROP TABLE IF EXISTS stg_admin_pieces;
+
+CREATE TABLE stg_admin_pieces AS
+SELECT
+    ab.osm_id,
+    ST_Subdivide(ab.geom, 256) AS geom
+FROM demo.admin_boundaries ab
+JOIN demo.countries c
+  ON c.id = ab.country_id
+WHERE c.slug = :'country_slug';
+
+CREATE INDEX stg_admin_pieces_geom_gix ON stg_admin_pieces USING GIST (geom);
+CREATE INDEX stg_admin_pieces_osm_idx ON stg_admin_pieces (osm_id);
+
+ANALYZE stg_admin_pieces;
+
+-- Every z14 tile crossed by an admin boundary, whether or not it is a country
+-- tile. Boundaries are cut into segments no longer than one tile edge, so each
+-- segment only has to be tested against the few tiles under its bbox.
+DROP TABLE IF EXISTS stg_admin_edge_tiles;
+
+CREATE TABLE stg_admin_edge_tiles AS
+WITH constants AS (
+    SELECT
+        20037508.342789244::double precision AS origin_m,
+        (40075016.68557849 / 16384.0)::double precision AS tile_edge_m
+), segments AS (
+    SELECT
+        ab.osm_id,
+        (ST_DumpSegments(ST_Segmentize(ST_Boundary(ab.geom), k.tile_edge_m))).geom AS geom
+    FROM demo.admin_boundaries ab
+    JOIN demo.countries c
+      ON c.id = ab.country_id
+    CROSS JOIN constants k
+    WHERE c.slug = :'country_slug'
+)
+SELECT DISTINCT
+    s.osm_id,
+    x::int AS x,
+    y::int AS y
+FROM segments s
+CROSS JOIN constants k
+CROSS JOIN LATERAL generate_series(
+    GREATEST(0, FLOOR((ST_XMin(s.geom) + k.origin_m) / k.tile_edge_m)::int),
+    LEAST(16383, FLOOR((ST_XMax(s.geom) + k.origin_m) / k.tile_edge_m)::int)
+) AS x
+CROSS JOIN LATERAL generate_series(
+    GREATEST(0, FLOOR((k.origin_m - ST_YMax(s.geom)) / k.tile_edge_m)::int),
+    LEAST(16383, FLOOR((k.origin_m - ST_YMin(s.geom)) / k.tile_edge_m)::int)
+) AS y
+WHERE ST_Intersects(ST_TileEnvelope(14, x, y), s.geom);
+
+ALTER TABLE stg_admin_edge_tiles
+    ADD CONSTRAINT stg_admin_edge_tiles_pk PRIMARY KEY (osm_id, y, x);
+
+DROP TABLE IF EXISTS stg_tile_admin_z14;
+
+CREATE TABLE stg_tile_admin_z14 AS
+WITH target_country AS (
+    SELECT id
+    FROM demo.countries
+    WHERE slug = :'country_slug'
+), edge_memberships AS (
+    -- Exact overlap only where a boundary crosses the tile.
+    SELECT
+        e.osm_id,
+        t.x,
+        t.y,
+        LEAST(1.0, SUM(ST_Area(ST_Intersection(t.geom, p.geom))) / ST_Area(t.geom)) AS overlap_ratio,
+        bool_or(ST_Covers(p.geom, t.centroid)) AS covers_centroid,
+        true AS is_edge_tile
+    FROM stg_admin_edge_tiles e
+    JOIN target_country tc
+      ON TRUE
+    JOIN demo.tiles_z14 t
+      ON t.country_id = tc.id
+     AND t.z = 14
+     AND t.x = e.x
+     AND t.y = e.y
+    JOIN stg_admin_pieces p
+      ON p.osm_id = e.osm_id
+     AND p.geom && t.geom
+    GROUP BY e.osm_id, t.country_id, t.z, t.x, t.y
+), row_gaps AS (
+    -- Runs of tiles between two edge tiles in the same row are either wholly
+    -- inside or wholly outside the area; tiles outside the first and last edge
+    -- tile of a row are always outside.
+    SELECT
+        osm_id,
+        y,
+        x + 1 AS gap_start,
+        next_x - 1 AS gap_end
+    FROM (
+        SELECT
+            osm_id,
+            x,
+            y,
+            LEAD(x) OVER (PARTITION BY osm_id, y ORDER BY x) AS next_x
+        FROM stg_admin_edge_tiles
+    ) edges
+    WHERE next_x > x + 1
+), inside_gaps AS (
+    -- One point-in-polygon test per run.
+    SELECT
+        g.osm_id,
+        g.y,
+        g.gap_start,
+        g.gap_end
+    FROM row_gaps g
+    WHERE EXISTS (
+        SELECT 1
+        FROM stg_admin_pieces p
+        WHERE p.osm_id = g.osm_id
+          AND ST_Covers(p.geom, ST_Centroid(ST_TileEnvelope(14, g.gap_start, g.y)))
+    )
+), interior_memberships AS (
+    SELECT
+        g.osm_id,
+        t.x,
+        t.y,
+        1.0::double precision AS overlap_ratio,
+        true AS covers_centroid,
+        false AS is_edge_tile
+    FROM inside_gaps g
+    JOIN target_country tc
+      ON TRUE
+    JOIN demo.tiles_z14 t
+      ON t.country_id = tc.id
+     AND t.z = 14
+     AND t.y = g.y
+     AND t.x BETWEEN g.gap_start AND g.gap_end
+), memberships AS (
+    SELECT osm_id, x, y, overlap_ratio, covers_centroid, is_edge_tile
+    FROM edge_memberships
+    WHERE overlap_ratio > 0.0 OR covers_centroid
+    UNION ALL
+    SELECT osm_id, x, y, overlap_ratio, covers_centroid, is_edge_tile
+    FROM interior_memberships
+), ranked AS (
+    SELECT
+        m.x,
+        m.y,
+        ab.admin_level,
+        m.osm_id,
+        m.overlap_ratio,
+        m.covers_centroid,
+        m.is_edge_tile,
+        ROW_NUMBER() OVER (
+            PARTITION BY ab.admin_level, m.x, m.y
+            ORDER BY m.covers_centroid DESC, m.overlap_ratio DESC, m.osm_id ASC
+        ) AS rn
+    FROM memberships m
+    JOIN target_country tc
+      ON TRUE
+    JOIN demo.admin_boundaries ab
+      ON ab.country_id = tc.id
+     AND ab.osm_id = m.osm_id
+)
+SELECT
+    14::int AS z,
+    x,
+    y,
+    admin_level,
+    osm_id AS admin_osm_id,
+    overlap_ratio,
+    covers_centroid,
+    is_edge_tile
+FROM ranked
+WHERE rn = 1;
+
+DELETE FROM demo.tile_admin_z14 ta
+USING demo.countries c
+WHERE ta.country_id = c.id
+  AND c.slug = :'country_slug';
+
+INSERT INTO demo.tile_admin_z14 (
+    country_id,
+    z,
+    x,
+    y,
+    admin_level,
+    admin_osm_id,
+    overlap_ratio,
+    covers_centroid,
+    is_edge_tile
+)
+SELECT
+    c.id AS country_id,
+    s.z,
+    s.x,
+    s.y,
+    s.admin_level,
+    s.admin_osm_id,
+    s.overlap_ratio,
+    s.covers_centroid,
+    s.is_edge_tile
+FROM stg_tile_admin_z14 s
+JOIN demo.countries c
+  ON c.slug = :'country_slug';
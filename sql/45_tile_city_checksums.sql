@@ -0,0 +1,65 @@
+\set ON_ERROR_STOP on
+
+DROP TABLE IF EXISTS stg_tile_city_checksums;
+
+CREATE TABLE stg_tile_city_checksums AS
+SELECT
+    t.block_z,
+    t.block_x,
+    t.block_y,
+    t.tile_count,
+    t.checksum
+FROM demo.countries c
+CROSS JOIN LATERAL demo.tile_city_checksum_tree(c.id) t
+WHERE c.slug = :'country_slug';
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM stg_tile_city_checksums WHERE block_z = 0) THEN
+        RAISE EXCEPTION 'demo.tile_city_z14 has no rows for this country; run assign before checksums';
+    END IF;
+END $$;
+
+INSERT INTO demo.tile_city_z14_builds (country_id, tile_count, root_checksum, built_at)
+SELECT
+    c.id AS country_id,
+    s.tile_count,
+    s.checksum,
+    now()
+FROM stg_tile_city_checksums s
+JOIN demo.countries c
+  ON c.slug = :'country_slug'
+WHERE s.block_z = 0
+RETURNING id AS build_id
+\gset
+
+INSERT INTO demo.tile_city_z14_checksums (
+    build_id,
+    block_z,
+    block_x,
+    block_y,
+    tile_count,
+    checksum
+)
+SELECT
+    :build_id,
+    block_z,
+    block_x,
+    block_y,
+    tile_count,
+    checksum
+FROM stg_tile_city_checksums;
+
+\echo '=== Tile assignment checksum build ==='
+SELECT
+    b.id AS build_id,
+    b.tile_count,
+    b.root_checksum,
+    (
+        SELECT COUNT(*)
+        FROM demo.tile_city_z14_checksums s
+        WHERE s.build_id = b.id
+          AND s.block_z = 10
+    ) AS z10_block_count
+FROM demo.tile_city_z14_builds b
+WHERE b.id = :build_id;
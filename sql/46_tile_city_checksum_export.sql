@@ -0,0 +1,56 @@
+\set ON_ERROR_STOP on
+
+CREATE TEMP TABLE export_build AS
+SELECT
+    b.id AS build_id,
+    b.country_id,
+    b.root_checksum,
+    b.id = (
+        SELECT MAX(latest.id)
+        FROM demo.tile_city_z14_builds latest
+        WHERE latest.country_id = b.country_id
+    ) AS is_latest
+FROM demo.tile_city_z14_builds b
+JOIN demo.countries c
+  ON c.id = b.country_id
+WHERE c.slug = :'country_slug'
+  AND (
+      NULLIF(:'build_id', '') IS NULL
+      OR b.id = NULLIF(:'build_id', '')::bigint
+  )
+ORDER BY b.id DESC
+LIMIT 1;
+
+DO $$
+DECLARE
+    export record;
+BEGIN
+    SELECT * INTO export FROM export_build;
+    IF export.build_id IS NULL THEN
+        RAISE EXCEPTION 'No checksum build found for this country; run the checksums stage first';
+    END IF;
+    -- Consumers sync to the live table, so the latest tree must still match it.
+    IF export.is_latest
+       AND export.root_checksum IS DISTINCT FROM (
+           SELECT t.checksum
+           FROM demo.tile_city_checksum_tree(export.country_id) t
+           WHERE t.block_z = 0
+       ) THEN
+        RAISE EXCEPTION
+            'demo.tile_city_z14 changed since checksum build %; run the checksums stage before exporting',
+            export.build_id;
+    END IF;
+END $$;
+
+COPY (
+    SELECT
+        s.block_z,
+        s.block_x,
+        s.block_y,
+        s.tile_count,
+        s.checksum
+    FROM demo.tile_city_z14_checksums s
+    JOIN export_build e
+      ON e.build_id = s.build_id
+    ORDER BY s.block_z, s.block_x, s.block_y
+) TO STDOUT WITH (FORMAT csv, HEADER true);
@@ -0,0 +1,139 @@
+\set ON_ERROR_STOP on
+
+CREATE TEMP TABLE diff_builds AS
+SELECT
+    c.id AS country_id,
+    (
+        SELECT b.id
+        FROM demo.tile_city_z14_builds b
+        WHERE b.country_id = c.id
+        ORDER BY b.id DESC
+        LIMIT 1
+    ) AS current_build_id,
+    NULLIF(:'since_build', '')::bigint AS since_build_id,
+    (
+        SELECT b.country_id
+        FROM demo.tile_city_z14_builds b
+        WHERE b.id = NULLIF(:'since_build', '')::bigint
+    ) AS since_build_country_id
+FROM demo.countries c
+WHERE c.slug = :'country_slug';
+
+DO $$
+DECLARE
+    builds record;
+BEGIN
+    SELECT * INTO builds FROM diff_builds;
+    IF builds.current_build_id IS NULL THEN
+        RAISE EXCEPTION 'No checksum build found for this country; run the checksums stage first';
+    END IF;
+    IF builds.since_build_id IS NOT NULL
+       AND builds.since_build_country_id IS DISTINCT FROM builds.country_id THEN
+        RAISE EXCEPTION 'Build % does not exist for this country', builds.since_build_id;
+    END IF;
+    -- Tiles are streamed from the live table, so the recorded tree must match it.
+    IF (
+        SELECT b.root_checksum
+        FROM demo.tile_city_z14_builds b
+        WHERE b.id = builds.current_build_id
+    ) IS DISTINCT FROM (
+        SELECT t.checksum
+        FROM demo.tile_city_checksum_tree(builds.country_id) t
+        WHERE t.block_z = 0
+    ) THEN
+        RAISE EXCEPTION
+            'demo.tile_city_z14 changed since checksum build %; run the checksums stage before diff',
+            builds.current_build_id;
+    END IF;
+END $$;
+
+CREATE TEMP TABLE diff_base_checksums (
+    block_z int NOT NULL,
+    block_x int NOT NULL,
+    block_y int NOT NULL,
+    tile_count int NOT NULL,
+    checksum text NOT NULL,
+    PRIMARY KEY (block_z, block_x, block_y)
+);
+
+\if :from_checksum_file
+\copy diff_base_checksums FROM pstdin WITH (FORMAT csv, HEADER true)
+\else
+INSERT INTO diff_base_checksums (block_z, block_x, block_y, tile_count, checksum)
+SELECT
+    s.block_z,
+    s.block_x,
+    s.block_y,
+    s.tile_count,
+    s.checksum
+FROM demo.tile_city_z14_checksums s
+JOIN diff_builds d
+  ON d.since_build_id = s.build_id;
+\endif
+
+-- Walk the checksum tree top-down: z6 blocks are only compared when the
+-- country root differs, and z10 blocks only inside z6 blocks that differ.
+-- Each emitted block must be replaced wholesale by the consumer; a block row
+-- with empty tile columns means the block no longer has any tiles.
+COPY (
+    WITH current_checksums AS (
+        SELECT
+            s.block_z,
+            s.block_x,
+            s.block_y,
+            s.checksum
+        FROM demo.tile_city_z14_checksums s
+        JOIN diff_builds d
+          ON d.current_build_id = s.build_id
+    ), changed_root AS (
+        SELECT 1
+        FROM current_checksums cur
+        LEFT JOIN diff_base_checksums base
+          ON base.block_z = cur.block_z
+         AND base.block_x = cur.block_x
+         AND base.block_y = cur.block_y
+        WHERE cur.block_z = 0
+          AND base.checksum IS DISTINCT FROM cur.checksum
+    ), changed_z6 AS (
+        SELECT
+            COALESCE(cur.block_x, base.block_x) AS block_x,
+            COALESCE(cur.block_y, base.block_y) AS block_y
+        FROM (SELECT * FROM current_checksums WHERE block_z = 6) cur
+        FULL JOIN (SELECT * FROM diff_base_checksums WHERE block_z = 6) base
+          ON base.block_x = cur.block_x
+         AND base.block_y = cur.block_y
+        WHERE cur.checksum IS DISTINCT FROM base.checksum
+          AND EXISTS (SELECT 1 FROM changed_root)
+    ), changed_z10 AS (
+        SELECT
+            COALESCE(cur.block_x, base.block_x) AS block_x,
+            COALESCE(cur.block_y, base.block_y) AS block_y
+        FROM (SELECT * FROM current_checksums WHERE block_z = 10) cur
+        FULL JOIN (SELECT * FROM diff_base_checksums WHERE block_z = 10) base
+          ON base.block_x = cur.block_x
+         AND base.block_y = cur.block_y
+        JOIN changed_z6 z6
+          ON z6.block_x = COALESCE(cur.block_x, base.block_x) / 16
+         AND z6.block_y = COALESCE(cur.block_y, base.block_y) / 16
+        WHERE cur.checksum IS DISTINCT FROM base.checksum
+    )
+    SELECT
+        cz.block_x AS block_z10_x,
+        cz.block_y AS block_z10_y,
+        tc.z,
+        tc.x,
+        tc.y,
+        tc.city_osm_id,
+        tc.city_name,
+        tc.place_type,
+        tc.distance_m,
+        tc.assignment_method
+    FROM changed_z10 cz
+    CROSS JOIN diff_builds d
+    LEFT JOIN demo.tile_city_z14 tc
+      ON tc.country_id = d.country_id
+     AND tc.z = 14
+     AND tc.x BETWEEN cz.block_x * 16 AND cz.block_x * 16 + 15
+     AND tc.y BETWEEN cz.block_y * 16 AND cz.block_y * 16 + 15
+    ORDER BY cz.block_x, cz.block_y, tc.x, tc.y
+) TO STDOUT WITH (FORMAT csv, HEADER true);
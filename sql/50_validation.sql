@@ -87,3 +87,16 @@ WHERE t.country_id = :id
   AND t.land_sample_count < 5
 ORDER BY t.land_sample_ratio ASC, t.x, t.y
 LIMIT 20;
+
+\echo '=== Admin overlay coverage ==='
+SELECT
+    ta.admin_level,
+    COUNT(*) AS tile_count,
+    COUNT(*) FILTER (WHERE ta.is_edge_tile) AS edge_tile_count,
+    COUNT(*) FILTER (WHERE NOT ta.covers_centroid) AS centroid_outside_count,
+    ROUND(AVG(ta.overlap_ratio)::numeric, 4) AS avg_overlap_ratio,
+    (SELECT COUNT(*) FROM demo.tiles_z14 WHERE country_id = :id) - COUNT(*) AS tiles_without_area
+FROM demo.tile_admin_z14 ta
+WHERE ta.country_id = :id
+GROUP BY ta.admin_level
+ORDER BY ta.admin_level;